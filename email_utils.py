@@ -5,7 +5,7 @@ import secrets
 import requests
 from typing import Optional, Tuple
 
-from translations import translations
+from translations import resolved_translations, translations
 from email_templates import render_verification_email_html
 
 logger = logging.getLogger(__name__)
@@ -22,16 +22,9 @@ def _render_email_text(name: str, token: str, lang: str = "nl") -> Tuple[str, st
     lang = lang if lang in translations else "en"
     frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000").rstrip("/")
     link = f"{frontend_url}/verify-email?token={token}"
-    subject = translations[lang]["email_verification_subject"]
-    lang_map = translations.get(lang, translations.get("en", {}))
-    body_template = lang_map.get("email_verification_body", "")
-    
-    # Als het een callable is (lambda), aanroepen met name en link
-    if callable(body_template):
-        body = body_template(name, link)
-    else:
-        body = body_template
-
+    lang_map = resolved_translations[lang]
+    subject = lang_map["email_verification_subject"]
+    body = lang_map["email_verification_body"].format(name=name, link=link)
     return subject, body
 
 # -------- Resend API ----------
@@ -85,7 +78,7 @@ def _render_password_reset_text(name: str, token: str, lang: str = "nl") -> Tupl
     frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000").rstrip("/")
     link = f"{frontend_url}/reset-password?token={token}"
     
-    lang_map = translations.get(lang, translations.get("en", {}))
+    lang_map = resolved_translations.get(lang, resolved_translations["en"])
     subject = lang_map.get("password_reset_subject", "Reset your password")
     
     body_template = lang_map.get("password_reset_body", 
@@ -98,7 +91,7 @@ def render_password_reset_html(name: str, link: str, lang: str = "nl") -> str:
     """
     HTML template voor password reset email.
     """
-    lang_map = translations.get(lang, translations.get("en", {}))
+    lang_map = resolved_translations.get(lang, resolved_translations["en"])
     button_text = lang_map.get("reset_password_button", "Reset Password")
     expires_text = lang_map.get("link_expires_1hour", "This link expires in 1 hour.")
     
@@ -1,25 +1,38 @@
 # main.py
 from __future__ import annotations
 
-from translations import translations
+from translations import resolved_translations, translations
 def get_lang(user: dict) -> str:
     lang = user.get("language", "nl")
     return lang if lang in translations else "en"
 
 def t(key: str, lang: str) -> str:
-    return translations.get(lang, translations["en"]).get(key, key)
+    return resolved_translations.get(lang, resolved_translations["en"]).get(key, key)
 
+import asyncio
+import atexit
+import base64
+import hashlib
 import logging
+import math
 import os
+import queue
 import re
+import threading
 import traceback
 from datetime import datetime, timedelta, timezone
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any, List, Optional, Tuple, Dict, Iterable
 
 import bcrypt
 import psycopg2
+from cachetools import TTLCache
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from fastapi import (
+    BackgroundTasks,
     Depends,
     FastAPI,
     HTTPException,
@@ -29,10 +42,13 @@ from fastapi import (
     WebSocketDisconnect,
     status,
     Header,
+    Query,
 )
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from haversine import Unit, haversine
@@ -42,16 +58,29 @@ from pydantic import BaseModel, Field, HttpUrl, validator
 import uvicorn
 
 # ------------------------- Config & Logging -------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()],
-)
+# Logregels gaan via een queue naar een aparte listener-thread: de request-thread
+# vult alleen de %-argumenten in en zet het record in de queue; het schrijven naar
+# stdout (de syscall) gebeurt in de listener.
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_stream_handler, respect_handler_level=True)
+_log_queue_handler = QueueHandler(_log_queue)
+_log_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=logging.INFO, handlers=[_log_queue_handler])
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger("app")
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+ACCESS_TOKEN_EXPIRE = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+PASSWORD_RESET_TOKEN_EXPIRE = timedelta(hours=1)
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "10"))
+# Cost van de timing-dummy: standaard BCRYPT_ROUNDS, de cost van nieuwe en bij login opnieuw
+# gehashte wachtwoorden. Alleen overschrijven zolang de meeste accounts nog een oude cost hebben.
+DUMMY_HASH_ROUNDS = int(os.environ.get("DUMMY_HASH_ROUNDS", str(BCRYPT_ROUNDS)))
 COOKIE_NAME = "access_token"
 
 # ------------------------- Env & Secrets ---------------------------
@@ -82,6 +111,40 @@ REPLIT_DEV_DOMAIN = os.environ.get("REPLIT_DEV_DOMAIN", "")
 # ------------------------- App init --------------------------------
 app = FastAPI(title="Sports Match API", version="2.2.0")
 
+# Idempotency-Key voor DELETE-requests: een retry (bv. na netwerkverlies op mobiel) met
+# dezelfde sleutel krijgt het eerder succesvolle antwoord terug zonder de database te raken.
+# Sleutel = sha256(token + methode + pad + Idempotency-Key), zodat antwoorden nooit tussen
+# gebruikers gedeeld worden; de hash van de body staat bij het antwoord, en een hergebruikte
+# sleutel met een andere body krijgt een 422. Alleen de event-loop raakt de cache aan, dus geen lock nodig.
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "300"))
+_idempotency_cache: TTLCache = TTLCache(maxsize=10000, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+@app.middleware("http")
+async def replay_idempotent_deletes(request: Request, call_next):
+    idem_key = request.headers.get("idempotency-key") or request.headers.get("x-idempotency-key")
+    if request.method != "DELETE" or not idem_key:
+        return await call_next(request)
+    authorization = request.headers.get("authorization", "")
+    token = authorization[7:] if authorization.lower().startswith("bearer ") else request.cookies.get(COOKIE_NAME, "")
+    cache_key = hashlib.sha256(
+        "\0".join((token, request.method, request.url.path, idem_key)).encode("utf-8")
+    ).digest()
+    body_hash = hashlib.sha256(await request.body()).digest()
+    cached = _idempotency_cache.get(cache_key)
+    if cached is not None:
+        cached_body_hash, status_code, body, media_type = cached
+        if cached_body_hash != body_hash:
+            return JSONResponse(status_code=422, content={"detail": t("idempotency_key_reused", "en")})
+        return Response(content=body, status_code=status_code, media_type=media_type,
+                        headers={"Idempotent-Replayed": "true"})
+    response = await call_next(request)
+    if not 200 <= response.status_code < 300:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    _idempotency_cache[cache_key] = (body_hash, response.status_code, body, response.media_type)
+    return Response(content=body, status_code=response.status_code,
+                    headers=dict(response.headers), media_type=response.media_type)
+
 # Middleware: log of auth header/cookie aanwezig is
 @app.middleware("http")
 async def log_requests_and_responses(request: Request, call_next):
@@ -134,6 +197,9 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Gzip voor grotere JSON-lijsten (suggesties, matches, chatgeschiedenis)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # ------------------------- Static Files ----------------------------
 # Mount static files to serve profile photos
 static_dir = os.path.join(os.path.dirname(__file__), "attached_assets", "stock_images")
@@ -145,12 +211,19 @@ else:
 
 # ------------------------- DB Pool & Helpers -----------------------
 pool: Optional[ThreadedConnectionPool] = None
+POOL_MIN_CONN = int(os.environ.get("DB_POOL_MIN_CONN", "5"))
+POOL_MAX_CONN = int(os.environ.get("DB_POOL_MAX_CONN", "20"))
+# Sync endpoints draaien in de threadpool van Starlette (meer threads dan connecties):
+# wacht op een vrije connectie i.p.v. een PoolError bij een uitgeputte pool. Nooit onbeperkt:
+# requests die al een connectie hebben, hebben zelf nog een thread uit dezelfde pool nodig.
+POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "5"))
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONN)
 
 def init_pool() -> None:
     """Initialiseer één thread-safe connection pool voor de app."""
     global pool
     if pool is None:
-        pool = ThreadedConnectionPool(minconn=1, maxconn=10, dsn=DATABASE_URL)
+        pool = ThreadedConnectionPool(minconn=POOL_MIN_CONN, maxconn=POOL_MAX_CONN, dsn=DATABASE_URL)
         logger.info("PostgreSQL connection pool geïnitialiseerd.")
 
 class DB:
@@ -158,13 +231,22 @@ class DB:
     def __enter__(self) -> Tuple[psycopg2.extensions.connection, psycopg2.extensions.cursor]:
         if pool is None:
             raise RuntimeError("DB pool is niet geïnitialiseerd.")
+        if not _pool_slots.acquire(timeout=POOL_TIMEOUT_SECONDS):
+            logger.warning("Geen vrije databaseconnectie binnen %.1fs; request geweigerd (503).", POOL_TIMEOUT_SECONDS)
+            raise HTTPException(status_code=503, detail=t("server_busy", "en"))
+        try:
+            return self._checkout()
+        except Exception:
+            _pool_slots.release()
+            raise
+    def _checkout(self) -> Tuple[psycopg2.extensions.connection, psycopg2.extensions.cursor]:
         self.conn = pool.getconn()
         try:
             self.cur = self.conn.cursor()
             self.cur.execute("SET search_path TO public;")
             return self.conn, self.cur
         except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-            logger.warning(f"Stale connection detected, getting fresh connection: {e}")
+            logger.warning("Stale connection detected, getting fresh connection: %s", e)
             try:
                 pool.putconn(self.conn, close=True)
             except Exception:
@@ -183,6 +265,7 @@ class DB:
             self.cur.close()
             if pool:
                 pool.putconn(self.conn)
+            _pool_slots.release()
 
 def get_db():
     with DB() as (conn, cur):
@@ -198,23 +281,29 @@ class UserBase(BaseModel):
 class UserInDB(UserBase):
     password_hash: str
 
+# Wachtwoordregels: één keer gecompileerd, gedeeld door registratie en wachtwoord-reset
+_PASSWORD_RULES = (
+    (re.compile(r"[a-z]"), "Wachtwoord moet minimaal één kleine letter bevatten."),
+    (re.compile(r"[A-Z]"), "Wachtwoord moet minimaal één hoofdletter bevatten."),
+    (re.compile(r"[0-9]"), "Wachtwoord moet minimaal één cijfer bevatten."),
+    (re.compile(r"[\\#\?!@$%^&*\-]"), "Wachtwoord moet minimaal één speciaal karakter bevatten."),
+)
+
+def check_password_strength(v: str) -> str:
+    if len(v) < 8:
+        raise ValueError("Wachtwoord moet minimaal 8 karakters lang zijn.")
+    for pattern, message in _PASSWORD_RULES:
+        if not pattern.search(v):
+            raise ValueError(message)
+    return v
+
 class UserCreate(UserBase):
     password: str
     email: Optional[str] = None
     
     @validator("password")
     def validate_password_strength(cls, v: str) -> str:
-        if len(v) < 8:
-            raise ValueError("Wachtwoord moet minimaal 8 karakters lang zijn.")
-        if not re.search(r"[a-z]", v):
-            raise ValueError("Wachtwoord moet minimaal één kleine letter bevatten.")
-        if not re.search(r"[A-Z]", v):
-            raise ValueError("Wachtwoord moet minimaal één hoofdletter bevatten.")
-        if not re.search(r"[0-9]", v):
-            raise ValueError("Wachtwoord moet minimaal één cijfer bevatten.")
-        if not re.search(r"[\\#\?!@$%^&*\-]", v):
-            raise ValueError("Wachtwoord moet minimaal één speciaal karakter bevatten.")
-        return v
+        return check_password_strength(v)
 
 class Token(BaseModel):
     access_token: str
@@ -246,9 +335,46 @@ class ChatMessage(BaseModel):
     message: str
     timestamp: str  # ISO8601
 
+# Response models voor de lijst-endpoints: FastAPI serialiseert deze direct via pydantic (Rust)
+# i.p.v. jsonable_encoder + json.dumps
+class ChatHistoryOut(BaseModel):
+    chat_history: List[ChatMessage]
+    next_before: Optional[str] = None
+    next_before_id: Optional[int] = None
+
+class MatchOut(BaseModel):
+    id: int
+    name: Optional[str] = None
+    age: Optional[int] = None
+    photo_url: Optional[str] = None
+
+class MatchesOut(BaseModel):
+    matches: List[MatchOut]
+
+class SuggestionOut(BaseModel):
+    id: int
+    name: Optional[str] = None
+    age: Optional[int] = None
+    bio: Optional[str] = None
+    gender: Optional[str] = None
+    city: Optional[str] = None
+    distance_km: Optional[float] = None
+    profile_photo_url: Optional[str] = None
+    photos: List[Optional[str]]
+    activities: List[Dict[str, Any]]
+    ytd_stats: Dict[str, Any]
+    sport_stats: Dict[str, Any]
+    sports_interests: List[str]
+
+class SuggestionsOut(BaseModel):
+    suggestions: List[SuggestionOut]
+
 class ReportRequest(BaseModel):
     reported_id: int
     reason: str
+
+class MatchIdsIn(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=100)
 class PhotoUpload(BaseModel):
     photo_url: HttpUrl
     is_profile_pic: Optional[bool] = False
@@ -299,7 +425,19 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
 def get_password_hash(plain_password: str) -> str:
-    return bcrypt.hashpw(plain_password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    return bcrypt.hashpw(plain_password.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True als de hash met een andere bcrypt-cost is gemaakt dan BCRYPT_ROUNDS ($2b$<cost>$...)."""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+# Vergelijkingshash voor onbekende gebruikers: login kost dan even lang als bij een bestaand account
+_DUMMY_PASSWORD_HASH = bcrypt.hashpw(
+    b"dummy-password-for-timing", bcrypt.gensalt(rounds=DUMMY_HASH_ROUNDS)
+).decode("utf-8")
 
 def create_access_token(data: Dict[str, Any], expires_delta: timedelta) -> str:
     to_encode = data.copy()
@@ -328,6 +466,29 @@ def _to_isoz(ts) -> str:
             return s
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
+# ------------------------- Chat-encryptie --------------------------
+# Nieuwe chatberichten: AES-GCM met een eigen, via HKDF van ENCRYPTION_KEY afgeleide sleutel.
+# Oudere berichten (Fernet-tokens zonder prefix) blijven leesbaar via cipher_suite.
+CHAT_CIPHER_PREFIX = "v2:"
+CHAT_HISTORY_LIMIT = 200  # max. aantal (meest recente) berichten per opvraging
+_chat_aead = AESGCM(
+    HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"chat-messages").derive(
+        ENCRYPTION_KEY.encode("utf-8")
+    )
+)
+
+def encrypt_chat_message(plain: str) -> str:
+    nonce = os.urandom(12)
+    ct = _chat_aead.encrypt(nonce, plain.encode("utf-8"), None)
+    return CHAT_CIPHER_PREFIX + base64.b64encode(nonce + ct).decode("ascii")
+
+def decrypt_chat_message(stored: str) -> str:
+    """Ontsleutel een opgeslagen chatbericht (AES-GCM of legacy Fernet)."""
+    if stored.startswith(CHAT_CIPHER_PREFIX):
+        raw = base64.b64decode(stored[len(CHAT_CIPHER_PREFIX):])
+        return _chat_aead.decrypt(raw[:12], raw[12:], None).decode("utf-8")
+    return cipher_suite.decrypt(stored.encode("utf-8")).decode("utf-8")
+
 # ------------------------- Strava helpers (mock) -------------------
 def get_latest_strava_coords(strava_token: Optional[str]) -> Optional[Tuple[float, float]]:
     """
@@ -371,16 +532,40 @@ async def get_bearer_token(
         return authorization[7:]
     return request.cookies.get(COOKIE_NAME)
 
-async def get_current_user(
-    token: Optional[str] = Depends(get_bearer_token),
-    db=Depends(get_db),
-):
-    conn, c = db
-    if not token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=t("token_missing", "en"),
-        )
+# Korte TTL-cache van token -> (exp, gebruiker): bespaart jwt.decode + user-SELECT per request.
+# Sleutel is de sha256 van het token (nooit het token zelf).
+AUTH_CACHE_TTL_SECONDS = int(os.environ.get("AUTH_CACHE_TTL_SECONDS", "30"))
+_auth_cache: TTLCache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_TTL_SECONDS)
+_auth_cache_lock = threading.Lock()
+
+def _auth_cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+def invalidate_auth_cache(user_id: int) -> None:
+    """Verwijder gecachte gebruikersgegevens na een wijziging aan de users-rij (pas na de commit)."""
+    with _auth_cache_lock:
+        for key in [k for k, (_, u) in _auth_cache.items() if u["id"] == user_id]:
+            _auth_cache.pop(key, None)
+
+def get_cached_user(token: str) -> Optional[dict]:
+    """Gebruiker uit de auth-cache (kopie), of None. Raakt de database niet."""
+    key = _auth_cache_key(token)
+    with _auth_cache_lock:
+        cached = _auth_cache.get(key)
+        if cached is None:
+            return None
+        expires_at, user = cached
+        # Nooit langer geldig dan de exp-claim van het token zelf
+        if expires_at is not None and expires_at <= datetime.now(timezone.utc).timestamp():
+            _auth_cache.pop(key, None)
+            return None
+    return dict(user)
+
+def resolve_user_from_token(token: str, c) -> dict:
+    """Gedeelde token-validatie voor HTTP en WebSocket: cache, anders jwt.decode + user-SELECT."""
+    cached = get_cached_user(token)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: Optional[str] = payload.get("sub")
@@ -400,7 +585,7 @@ async def get_current_user(
     row = c.fetchone()
     if not row:
         raise HTTPException(status_code=401, detail=t("user_not_found", "en"))
-    return {
+    user = {
         "id": row[0],
         "username": row[1],
         "name": row[2],
@@ -417,12 +602,32 @@ async def get_current_user(
         "profile_setup_complete": row[13],
         "sports_interests": parse_pg_array(row[14]),
     }
+    with _auth_cache_lock:
+        _auth_cache[_auth_cache_key(token)] = (payload.get("exp"), user)
+    return dict(user)
+
+def get_current_user(
+    token: Optional[str] = Depends(get_bearer_token),
+    db=Depends(get_db),
+):
+    conn, c = db
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=t("token_missing", "en"),
+        )
+    return resolve_user_from_token(token, c)
 
 # ------------------------- Startup / Shutdown ----------------------
+SCHEMA_LOCK_ID = 4711  # vaste sleutel voor pg_advisory_xact_lock tijdens schema-bootstrap
+
 @app.on_event("startup")
 def on_startup():
     init_pool()
     with DB() as (conn, c):
+        # Meerdere workers starten tegelijk: serialiseer de schema-bootstrap met een
+        # transactie-advisory-lock (vrijgegeven bij commit/rollback van deze transactie).
+        c.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
         # Tabellen
         c.execute(
             """
@@ -482,7 +687,7 @@ def on_startup():
             CREATE TABLE IF NOT EXISTS user_blocks (
                 blocker_id INTEGER,
                 blocked_id INTEGER,
-                timestamp TIMESTAMPTZ,
+                timestamp TIMESTAMPTZ DEFAULT NOW(),
                 PRIMARY KEY (blocker_id, blocked_id)
             )
             """
@@ -494,7 +699,7 @@ def on_startup():
                 reporter_id INTEGER,
                 reported_id INTEGER,
                 reason TEXT,
-                timestamp TIMESTAMPTZ
+                timestamp TIMESTAMPTZ DEFAULT NOW()
             )
             """
         )
@@ -542,17 +747,78 @@ def on_startup():
             WHERE deleted_at IS NULL
             """
         )
+        c.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_swipes_swipee_liked
+            ON swipes (swipee_id, liked)
+            WHERE deleted_at IS NULL
+            """
+        )
+        # De mutual_matches-view probeert al exact via de primary key (swiper_id, swipee_id)
+        c.execute("DROP INDEX IF EXISTS idx_swipes_liked_pair")
+        c.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_users_active_age
+            ON users (age)
+            WHERE deleted_at IS NULL
+            """
+        )
         c.execute("CREATE INDEX IF NOT EXISTS idx_blocks_pair ON user_blocks (blocker_id, blocked_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_blocks_blocked ON user_blocks (blocked_id, blocker_id)")
+        # (match_id, timestamp, id) dekt de oude idx_chats_match(_ts) en levert sortering én (timestamp, id)-cursor
         c.execute(
             """
-            CREATE INDEX IF NOT EXISTS idx_chats_match
-            ON chats (match_id)
+            CREATE INDEX IF NOT EXISTS idx_chats_match_ts_id
+            ON chats (match_id, timestamp, id)
             WHERE deleted_at IS NULL
             """
         )
+        c.execute("DROP INDEX IF EXISTS idx_chats_match")
+        c.execute("DROP INDEX IF EXISTS idx_chats_match_ts")
         c.execute("CREATE INDEX IF NOT EXISTS idx_avail_user ON user_availabilities(user_id)")
+        c.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_user_photos_profile
+            ON user_photos (user_id, id DESC)
+            WHERE is_profile_pic = 1
+            """
+        )
+        c.execute("CREATE INDEX IF NOT EXISTS idx_user_photos_user ON user_photos (user_id)")
+
+        # Views
+        # Wederzijdse like, in beide richtingen: (user_id, match_id) én (match_id, user_id)
+        c.execute(
+            """
+            CREATE OR REPLACE VIEW mutual_matches AS
+            SELECT s1.swiper_id AS user_id, s1.swipee_id AS match_id
+            FROM swipes s1
+            JOIN swipes s2
+              ON s2.swiper_id = s1.swipee_id
+             AND s2.swipee_id = s1.swiper_id
+             AND s2.liked = TRUE
+             AND s2.deleted_at IS NULL
+            WHERE s1.liked = TRUE
+              AND s1.deleted_at IS NULL
+            """
+        )
 
         # Migraties
+        # users.latitude/longitude (suggesties) + index voor de bounding-box-voorfilter
+        c.execute(
+            """
+            ALTER TABLE users
+                ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION
+            """
+        )
+        c.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_users_active_lat_lng
+            ON users (latitude, longitude)
+            WHERE deleted_at IS NULL
+            """
+        )
+
         # chats.timestamp -> timestamptz (idempotent)
         c.execute(
             """
@@ -567,6 +833,11 @@ def on_startup():
             c.execute("ALTER TABLE chats ALTER COLUMN timestamp TYPE TIMESTAMPTZ USING (timestamp::timestamptz)")
             logger.info("Migratie voltooid: chats.timestamp is nu TIMESTAMPTZ.")
 
+        # DEFAULT NOW() ook op oudere tabellen: send_message geeft de tijd niet meer mee (idempotent)
+        c.execute("ALTER TABLE chats ALTER COLUMN timestamp SET DEFAULT NOW()")
+        c.execute("ALTER TABLE user_blocks ALTER COLUMN timestamp SET DEFAULT NOW()")
+        c.execute("ALTER TABLE user_reports ALTER COLUMN timestamp SET DEFAULT NOW()")
+
 @app.on_event("shutdown")
 def on_shutdown():
     global pool
@@ -576,7 +847,17 @@ def on_shutdown():
     pool = None
 
 # ------------------------- Email utils -----------------------------
-from email_utils import generate_verification_token, send_verification_email
+from email_utils import generate_verification_token, send_password_reset_email, send_verification_email
+
+def send_email_in_background(send, *args, **kwargs) -> None:
+    """Achtergrondtaak: draait na de response. De routes die dit inplannen gebruiken
+    get_db met scope="function", zodat het token al gecommit is en de connectie terug
+    in de pool staat voordat Resend wordt aangeroepen.
+    Fouten worden gelogd (email_utils logt de details); de gebruiker kan opnieuw aanvragen."""
+    try:
+        send(*args, **kwargs)
+    except Exception:
+        logger.warning("Versturen van e-mail op de achtergrond mislukt (%s).", getattr(send, "__name__", send))
 
 # ------------------------- Endpoints -------------------------------
 @app.get("/me")
@@ -597,7 +878,7 @@ async def me(current_user: dict = Depends(get_current_user)):
     }
 
 @app.patch("/users/{user_id}", response_model=UserPublic)
-async def patch_user(
+def patch_user(
     user_id: int,
     payload: UserUpdate,
     current_user: dict = Depends(get_current_user),
@@ -619,6 +900,9 @@ async def patch_user(
         f"UPDATE users SET {', '.join(updates)} WHERE id=%s AND deleted_at IS NULL",
         tuple(values)
     )
+    conn.commit()
+    invalidate_auth_cache(user_id)
+    invalidate_suggestions_cache(user_id)
     c.execute("SELECT id, username, name, age, bio, COALESCE(language,'nl'), COALESCE(profile_setup_complete, FALSE), COALESCE(sports_interests, '{}'), latitude, longitude, city FROM users WHERE id=%s", (user_id,))
     row = c.fetchone()
     if not row:
@@ -638,7 +922,7 @@ async def patch_user(
     }
 
 @app.get("/users/{user_id}/settings")
-async def get_user_settings(
+def get_user_settings(
     user_id: int,
     current_user: dict = Depends(get_current_user),
     db=Depends(get_db),
@@ -666,7 +950,7 @@ async def get_user_settings(
     }
 
 @app.post("/users/{user_id}/settings")
-async def save_user_settings(
+def save_user_settings(
     user_id: int,
     payload: UserSettingsModel,
     current_user: dict = Depends(get_current_user),
@@ -691,6 +975,8 @@ async def save_user_settings(
         """,
         (user_id, data["match_goal"], data["preferred_gender"], data["max_distance_km"], data["notifications_enabled"], filter_sports_val),
     )
+    conn.commit()
+    invalidate_suggestions_cache(user_id)
     return {"status": "success", "message": t("ok", lang)}
 
 class AvailabilityItem(BaseModel):
@@ -709,7 +995,7 @@ def _validate_time(hhmm: str) -> Tuple[int, int]:
     return h, m
 
 @app.get("/users/{user_id}/availability")
-async def get_availability(
+def get_availability(
     user_id: int,
     current_user: dict = Depends(get_current_user),
     db=Depends(get_db),
@@ -733,7 +1019,7 @@ async def get_availability(
     return {"availability": items}
 
 @app.post("/users/{user_id}/availability")
-async def save_availability(
+def save_availability(
     user_id: int,
     payload: List[AvailabilityItem],
     current_user: dict = Depends(get_current_user),
@@ -776,7 +1062,7 @@ async def save_availability(
         raise HTTPException(status_code=500, detail=t("db_error", lang))
 
 @app.post("/photos/{photo_id}/set_profile")
-async def set_profile_photo(
+def set_profile_photo(
     photo_id: int,
     current_user: dict = Depends(get_current_user),
     db=Depends(get_db),
@@ -797,7 +1083,7 @@ async def set_profile_photo(
     return {"status": "success", "message": t("ok", lang)}
 
 @app.post("/token", response_model=Token)
-async def login_for_access_token(
+def login_for_access_token(
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db=Depends(get_db),
@@ -810,7 +1096,9 @@ async def login_for_access_token(
         )
         row = c.fetchone()
         lang_guess = "nl" if not row else (row[1] if len(row) > 1 else "nl")
-        if not row or not verify_password(form_data.password, row[0]):
+        # Altijd één bcrypt-verificatie, ook als de gebruiker niet bestaat (geen timing-lek)
+        password_ok = verify_password(form_data.password, row[0] if row else _DUMMY_PASSWORD_HASH)
+        if not row or not password_ok:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=t("incorrect_credentials", get_lang({"language": lang_guess})),
@@ -821,8 +1109,14 @@ async def login_for_access_token(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=t("email_not_verified", get_lang({"language": lang_guess})),
             )
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(data={"sub": form_data.username}, expires_delta=access_token_expires)
+        # Hash transparant omzetten naar de huidige cost (op- of afwaarderen); pas na de
+        # verificatiecheck, anders draait de 403 de UPDATE toch weer terug
+        if password_needs_rehash(row[0]):
+            c.execute(
+                "UPDATE users SET password_hash = %s WHERE username = %s AND deleted_at IS NULL",
+                (get_password_hash(form_data.password), form_data.username),
+            )
+        access_token = create_access_token(data={"sub": form_data.username}, expires_delta=ACCESS_TOKEN_EXPIRE)
         # Cookie zetten (fallback)
         response.set_cookie(
             key=COOKIE_NAME,
@@ -840,7 +1134,7 @@ async def login_for_access_token(
         raise HTTPException(status_code=500, detail=t("internal_server_error", "en"))
 
 @app.post("/register")
-async def create_user(user: UserCreate, db=Depends(get_db)):
+def create_user(user: UserCreate, background_tasks: BackgroundTasks, db=Depends(get_db, scope="function")):
     conn, c = db
     password_hash = get_password_hash(user.password)
     try:
@@ -866,9 +1160,11 @@ async def create_user(user: UserCreate, db=Depends(get_db)):
             (user_id, token)
         )
 
-        # Mail versturen naar het email adres van de gebruiker
+        # Mail versturen naar het email adres van de gebruiker (na de response)
         if user.email:
-            send_verification_email(user.email, user.name, token, lang=lang)
+            background_tasks.add_task(
+                send_email_in_background, send_verification_email, user.email, user.name, token, lang=lang
+            )
 
         logger.info("Nieuwe gebruiker aangemaakt: %s", user.username)
         return {
@@ -889,7 +1185,7 @@ async def create_user(user: UserCreate, db=Depends(get_db)):
         raise HTTPException(status_code=500, detail=t("internal_server_error", "en"))
 
 @app.post("/resend-verification")
-async def resend_verification(username: str, db=Depends(get_db)):
+def resend_verification(username: str, background_tasks: BackgroundTasks, db=Depends(get_db, scope="function")):
     conn, c = db
     c.execute("SELECT id, name, email, is_verified, COALESCE(language,'nl') FROM users WHERE username = %s AND deleted_at IS NULL", (username,))
     row = c.fetchone()
@@ -903,11 +1199,11 @@ async def resend_verification(username: str, db=Depends(get_db)):
         raise HTTPException(status_code=400, detail=t("no_email_address", lang))
     token = generate_verification_token()
     c.execute("INSERT INTO email_verification_tokens (user_id, token) VALUES (%s, %s)", (user_id, token))
-    send_verification_email(email, name, token, lang=lang)
+    background_tasks.add_task(send_email_in_background, send_verification_email, email, name, token, lang=lang)
     return {"status": "success", "message": t("verification_email_sent", lang)}
 
 @app.get("/verify-email")
-async def verify_email(token: str, db=Depends(get_db)):
+def verify_email(token: str, db=Depends(get_db)):
     conn, c = db
     c.execute(
         """
@@ -940,25 +1236,18 @@ class ResetPasswordRequest(BaseModel):
     
     @validator("new_password")
     def validate_password_strength(cls, v: str) -> str:
-        if len(v) < 8:
-            raise ValueError("Wachtwoord moet minimaal 8 karakters lang zijn.")
-        if not re.search(r"[a-z]", v):
-            raise ValueError("Wachtwoord moet minimaal één kleine letter bevatten.")
-        if not re.search(r"[A-Z]", v):
-            raise ValueError("Wachtwoord moet minimaal één hoofdletter bevatten.")
-        if not re.search(r"[0-9]", v):
-            raise ValueError("Wachtwoord moet minimaal één cijfer bevatten.")
-        if not re.search(r"[\\#\?!@$%^&*\-]", v):
-            raise ValueError("Wachtwoord moet minimaal één speciaal karakter bevatten.")
-        return v
+        return check_password_strength(v)
 
 
 @app.post("/forgot-password")
-async def forgot_password(request: ForgotPasswordRequest, db=Depends(get_db)):
+def forgot_password(
+    request: ForgotPasswordRequest,
+    background_tasks: BackgroundTasks,
+    db=Depends(get_db, scope="function"),
+):
     """
     Vraag een wachtwoord reset aan. Stuurt een email met reset link.
     """
-    from email_utils import send_password_reset_email
     conn, c = db
     
     # Zoek gebruiker op email
@@ -978,7 +1267,7 @@ async def forgot_password(request: ForgotPasswordRequest, db=Depends(get_db)):
     
     # Genereer reset token
     token = generate_verification_token()
-    expires_at = datetime.utcnow() + timedelta(hours=1)
+    expires_at = datetime.now(timezone.utc) + PASSWORD_RESET_TOKEN_EXPIRE
     
     # Sla token op
     c.execute(
@@ -986,18 +1275,15 @@ async def forgot_password(request: ForgotPasswordRequest, db=Depends(get_db)):
         (user_id, token, expires_at)
     )
     
-    # Verstuur email
-    try:
-        send_password_reset_email(email, name, token, lang=lang)
-        logger.info("Password reset email verzonden naar %s", email)
-    except Exception:
-        logger.exception("Fout bij verzenden password reset email")
+    # Verstuur email na de response: even snel antwoord als bij een onbekend adres
+    background_tasks.add_task(send_email_in_background, send_password_reset_email, email, name, token, lang=lang)
+    logger.info("Password reset email ingepland voor %s", email)
     
     return {"status": "success", "message": t("password_reset_sent", lang)}
 
 
 @app.post("/reset-password")
-async def reset_password(request: ResetPasswordRequest, db=Depends(get_db)):
+def reset_password(request: ResetPasswordRequest, db=Depends(get_db)):
     """
     Reset het wachtwoord met een geldige token.
     """
@@ -1021,8 +1307,10 @@ async def reset_password(request: ResetPasswordRequest, db=Depends(get_db)):
     user_id, expires_at, lang = row
     lang = get_lang({"language": lang})
     
-    # Controleer of token verlopen is
-    if datetime.utcnow() > expires_at.replace(tzinfo=None):
+    # Controleer of token verlopen is (naïeve waarden uit een TIMESTAMP-kolom zijn UTC)
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) > expires_at:
         raise HTTPException(status_code=400, detail=t("token_expired", lang))
     
     # Update wachtwoord
@@ -1037,7 +1325,7 @@ async def reset_password(request: ResetPasswordRequest, db=Depends(get_db)):
 
 
 @app.get("/users/{user_id}", response_model=UserProfile)
-async def read_user(user_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def read_user(user_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     conn, c = db
     lang = get_lang(current_user)
     c.execute(
@@ -1074,7 +1362,7 @@ async def read_user(user_id: int, current_user: dict = Depends(get_current_user)
     }
 
 @app.post("/users/{user_id}/preferences")
-async def update_user_preferences(
+def update_user_preferences(
     user_id: int,
     preferences: UserPreferences,
     current_user: dict = Depends(get_current_user),
@@ -1093,16 +1381,111 @@ async def update_user_preferences(
             """,
             (preferences.preferred_min_age, preferences.preferred_max_age, user_id),
         )
+        conn.commit()
+        invalidate_auth_cache(user_id)
+        invalidate_suggestions_cache(user_id)
         logger.info("Voorkeuren van gebruiker %s succesvol bijgewerkt.", user_id)
         return {"status": "success", "message": t("ok", lang)}
     except psycopg2.Error:
         logger.exception("Databasefout bij het bijwerken van voorkeuren.")
         raise HTTPException(status_code=500, detail=t("db_error", lang))
 
-@app.get("/suggestions")
-async def get_suggestions(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+# Vaste querytekst (geen string-concatenatie per filter): elk ontbrekend filter wordt
+# als NULL doorgegeven, zodat de server dezelfde statement-tekst steeds herkent.
+SUGGESTIONS_SQL = """
+    SELECT
+        u.id, u.name, u.age, u.bio, u.gender, u.latitude, u.longitude, u.city,
+        prof.photo_url AS profile_photo_url,
+        photos.photos AS photos,
+        u.sports_interests,
+        dist.distance_km
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT up.photo_url
+        FROM user_photos up
+        WHERE up.user_id = u.id AND up.is_profile_pic = 1
+        ORDER BY up.id DESC
+        LIMIT 1
+    ) prof ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT array_agg(up2.photo_url ORDER BY (up2.is_profile_pic=1) DESC, up2.id ASC) AS photos
+        FROM user_photos up2
+        WHERE up2.user_id = u.id
+    ) photos ON TRUE
+    CROSS JOIN LATERAL (
+        -- Haversine in SQL; NULL zodra een van beide locaties ontbreekt
+        SELECT 2 * 6371 * ASIN(SQRT(CASE WHEN h.a > 1 THEN 1 ELSE h.a END)) AS distance_km
+        FROM (
+            SELECT POWER(SIN(RADIANS(u.latitude - %(lat)s) / 2), 2)
+                   + COS(RADIANS(%(lat)s)) * COS(RADIANS(u.latitude)) * POWER(SIN(RADIANS(u.longitude - %(lon)s) / 2), 2) AS a
+        ) h
+    ) dist
+    WHERE u.id <> %(user_id)s
+      AND u.deleted_at IS NULL
+      AND COALESCE(u.profile_setup_complete, FALSE) = TRUE
+      AND NOT EXISTS (SELECT 1 FROM user_blocks b WHERE b.blocker_id = %(user_id)s AND b.blocked_id = u.id)
+      AND NOT EXISTS (SELECT 1 FROM user_blocks b WHERE b.blocker_id = u.id AND b.blocked_id = %(user_id)s)
+      AND NOT EXISTS (SELECT 1 FROM swipes s WHERE s.swiper_id = %(user_id)s AND s.swipee_id = u.id)
+      -- Ruwe bounding box vóór de Haversine, zodat de lat/lng-index bruikbaar is
+      AND (%(min_lat)s::float8 IS NULL OR u.latitude IS NULL OR u.latitude BETWEEN %(min_lat)s::float8 AND %(max_lat)s::float8)
+      AND (%(min_lon)s::float8 IS NULL OR u.longitude IS NULL OR u.longitude BETWEEN %(min_lon)s::float8 AND %(max_lon)s::float8)
+      AND (%(max_distance_km)s::int IS NULL OR dist.distance_km IS NULL OR dist.distance_km <= %(max_distance_km)s::int)
+      AND (%(gender)s::text IS NULL OR u.gender = %(gender)s::text)
+      AND (%(min_age)s::int IS NULL OR u.age >= %(min_age)s::int)
+      AND (%(max_age)s::int IS NULL OR u.age <= %(max_age)s::int)
+      AND (
+          %(sports)s::text[] IS NULL
+          OR COALESCE(cardinality(u.sports_interests), 0) = 0
+          OR u.sports_interests && %(sports)s::text[]
+      )
+    ORDER BY CASE WHEN u.name = 'Greta Hoffman' THEN 0 WHEN u.name IN ('Emma de Vries', 'Lucas Janssen', 'Sophie Bakker', 'Mike van Dijk') THEN 1 ELSE 2 END,
+             dist.distance_km ASC NULLS LAST, u.id
+    LIMIT %(limit)s
+"""
+# Altijd de eerste pagina: geswipete profielen vallen uit de set, dus de volgende
+# aanroep levert vanzelf de volgende kandidaten (OFFSET zou er juist overslaan)
+SUGGESTIONS_PAGE_SIZE = 50
+
+# Korte TTL-cache per gebruiker: herhaald verversen van het swipe-scherm kost dan
+# geen query. Eigen swipes, blokkades en profiel-/filterwijzigingen wissen de cache meteen;
+# wijzigingen bij andere gebruikers zijn hooguit SUGGESTIONS_CACHE_TTL_SECONDS oud.
+# Schrijvers wissen pas na conn.commit(), anders cachet een gelijktijdige GET de oude set.
+SUGGESTIONS_CACHE_TTL_SECONDS = int(os.environ.get("SUGGESTIONS_CACHE_TTL_SECONDS", "30"))
+_suggestions_cache: TTLCache = TTLCache(maxsize=5000, ttl=SUGGESTIONS_CACHE_TTL_SECONDS)
+_suggestions_cache_lock = threading.Lock()
+
+def invalidate_suggestions_cache(*user_ids: int) -> None:
+    """Wis gecachte suggesties van de opgegeven gebruikers (zonder ids: van iedereen)."""
+    with _suggestions_cache_lock:
+        if not user_ids:
+            _suggestions_cache.clear()
+            return
+        for user_id in user_ids:
+            _suggestions_cache.pop(user_id, None)
+
+def _bounding_box(lat, lon, km) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
+    """(min_lat, max_lat, min_lon, max_lon) rond een punt; None waar geen grens bruikbaar is
+    (geen locatie/afstand, pool binnen bereik of box over de datumgrens)."""
+    if lat is None or lon is None or not km:
+        return None, None, None, None
+    lat, lon = float(lat), float(lon)
+    r = km / 6371.0  # hoekafstand in radialen
+    min_lat, max_lat = lat - math.degrees(r), lat + math.degrees(r)
+    if min_lat <= -90 or max_lat >= 90 or math.sin(r) >= math.cos(math.radians(lat)):
+        return min_lat, max_lat, None, None
+    dlon = math.degrees(math.asin(math.sin(r) / math.cos(math.radians(lat))))
+    if lon - dlon < -180 or lon + dlon > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, lon - dlon, lon + dlon
+
+@app.get("/suggestions", response_model=SuggestionsOut)
+def get_suggestions(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     conn, c = db
     user_id = current_user["id"]
+    with _suggestions_cache_lock:
+        cached = _suggestions_cache.get(user_id)
+    if cached is not None:
+        return cached
     min_age = current_user.get("preferred_min_age")
     max_age = current_user.get("preferred_max_age")
     
@@ -1126,49 +1509,28 @@ async def get_suggestions(current_user: dict = Depends(get_current_user), db=Dep
     user_lat, user_lon = (user_data[0], user_data[1]) if user_data else (None, None)
     user_sports = parse_pg_array(user_data[2]) if user_data and user_data[2] else []
     
-    query = """
-        SELECT
-            u.id, u.name, u.age, u.bio, u.gender, u.latitude, u.longitude, u.city,
-            prof.photo_url AS profile_photo_url,
-            photos.photos AS photos,
-            u.sports_interests
-        FROM users u
-        LEFT JOIN LATERAL (
-            SELECT up.photo_url
-            FROM user_photos up
-            WHERE up.user_id = u.id AND up.is_profile_pic = 1
-            ORDER BY up.id DESC
-            LIMIT 1
-        ) prof ON TRUE
-        LEFT JOIN LATERAL (
-            SELECT array_agg(up2.photo_url ORDER BY (up2.is_profile_pic=1) DESC, up2.id ASC) AS photos
-            FROM user_photos up2
-            WHERE up2.user_id = u.id
-        ) photos ON TRUE
-        WHERE u.id <> %s
-          AND u.deleted_at IS NULL
-          AND COALESCE(u.profile_setup_complete, FALSE) = TRUE
-          AND NOT EXISTS (SELECT 1 FROM user_blocks b WHERE b.blocker_id = %s AND b.blocked_id = u.id)
-          AND NOT EXISTS (SELECT 1 FROM user_blocks b WHERE b.blocker_id = u.id AND b.blocked_id = %s)
-          AND NOT EXISTS (SELECT 1 FROM swipes s WHERE s.swiper_id = %s AND s.swipee_id = u.id)
-    """
-    params: List[Any] = [user_id, user_id, user_id, user_id]
-    
+    gender_map = {"male": "man", "female": "woman", "non_binary": "non_binary"}
+    mapped_gender = None
     if preferred_gender and preferred_gender != "any":
-        gender_map = {"male": "man", "female": "woman", "non_binary": "non_binary"}
         mapped_gender = gender_map.get(preferred_gender, preferred_gender)
-        query += " AND u.gender = %s"
-        params.append(mapped_gender)
-    
-    if min_age:
-        query += " AND u.age >= %s"
-        params.append(min_age)
-    if max_age:
-        query += " AND u.age <= %s"
-        params.append(max_age)
     
-    query += " ORDER BY CASE WHEN u.name = 'Greta Hoffman' THEN 0 WHEN u.name IN ('Emma de Vries', 'Lucas Janssen', 'Sophie Bakker', 'Mike van Dijk') THEN 1 ELSE 2 END, u.id LIMIT 200"
-    c.execute(query, tuple(params))
+    min_lat, max_lat, min_lon, max_lon = _bounding_box(user_lat, user_lon, max_distance_km)
+    c.execute(SUGGESTIONS_SQL, {
+        "user_id": user_id,
+        "lat": user_lat,
+        "lon": user_lon,
+        "max_distance_km": max_distance_km or None,
+        "min_lat": min_lat,
+        "max_lat": max_lat,
+        "min_lon": min_lon,
+        "max_lon": max_lon,
+        "gender": mapped_gender,
+        "min_age": min_age or None,
+        "max_age": max_age or None,
+        # Gedeelde sport vereist: eerst het sportfilter uit de settings, anders de eigen sporten
+        "sports": filter_sports or user_sports or None,
+        "limit": SUGGESTIONS_PAGE_SIZE,
+    })
     rows = c.fetchall()
     
     suggestions = []
@@ -1230,23 +1592,10 @@ async def get_suggestions(current_user: dict = Depends(get_current_user), db=Dep
             if db_photo and db_photo not in _photos:
                 _photos = [db_photo] + _photos[:2]
         
-        distance_km = None
-        if user_lat and user_lon and r[5] and r[6]:
-            distance_km = haversine((user_lat, user_lon), (r[5], r[6]), unit=Unit.KILOMETERS)
-            if max_distance_km and distance_km > max_distance_km:
-                continue
+        distance_km = r[11]
         
         target_sports = parse_pg_array(r[10]) if r[10] else []
         
-        if filter_sports and target_sports:
-            shared_sports = set(filter_sports) & set(target_sports)
-            if not shared_sports:
-                continue
-        elif user_sports and target_sports and not filter_sports:
-            shared_sports = set(user_sports) & set(target_sports)
-            if not shared_sports:
-                continue
-        
         # Mock sportstatistieken met realistische YTD data voor testusers
         mock_activities = []
         # Default YTD stats voor users zonder specifieke data (recreatief sporter - wandeltempo)
@@ -1360,10 +1709,13 @@ async def get_suggestions(current_user: dict = Depends(get_current_user), db=Dep
         })
     
     logger.info("Suggesties gegenereerd voor gebruiker %s. Aantal: %d", user_id, len(suggestions))
-    return {"suggestions": suggestions}
+    result = {"suggestions": suggestions}
+    with _suggestions_cache_lock:
+        _suggestions_cache[user_id] = result
+    return result
 
 @app.post("/swipe/{swipee_id}")
-async def swipe(
+def swipe(
     swipee_id: int,
     liked: bool,
     current_user: dict = Depends(get_current_user),
@@ -1375,39 +1727,41 @@ async def swipe(
     if swiper_id == swipee_id:
         raise HTTPException(status_code=400, detail=t("cannot_swipe_self", lang))
     try:
+        # Upsert en wederzijdse-like check in één round-trip
         c.execute(
             """
-            INSERT INTO swipes (swiper_id, swipee_id, liked, deleted_at)
-            VALUES (%s, %s, %s, NULL)
-            ON CONFLICT (swiper_id, swipee_id)
-            DO UPDATE SET liked = EXCLUDED.liked, deleted_at = NULL
-            """,
-            (swiper_id, swipee_id, liked),
-        )
-        logger.info("Gebruiker %s heeft op gebruiker %s geswipet (liked: %s).", swiper_id, swipee_id, liked)
-        match = False
-        if liked:
-            c.execute(
-                """
+            WITH ins AS (
+                INSERT INTO swipes (swiper_id, swipee_id, liked, deleted_at)
+                VALUES (%s, %s, %s, NULL)
+                ON CONFLICT (swiper_id, swipee_id)
+                DO UPDATE SET liked = EXCLUDED.liked, deleted_at = NULL
+                RETURNING liked
+            )
+            SELECT ins.liked AND EXISTS (
                 SELECT 1
                 FROM swipes
                 WHERE swiper_id = %s
                   AND swipee_id = %s
                   AND liked = TRUE
                   AND deleted_at IS NULL
-                """,
-                (swipee_id, swiper_id),
             )
-            if c.fetchone():
-                match = True
-                logger.info("Nieuwe match tussen gebruiker %s en gebruiker %s.", swiper_id, swipee_id)
+            FROM ins
+            """,
+            (swiper_id, swipee_id, liked, swipee_id, swiper_id),
+        )
+        logger.info("Gebruiker %s heeft op gebruiker %s geswipet (liked: %s).", swiper_id, swipee_id, liked)
+        match = bool(c.fetchone()[0])
+        conn.commit()
+        invalidate_suggestions_cache(swiper_id)
+        if match:
+            logger.info("Nieuwe match tussen gebruiker %s en gebruiker %s.", swiper_id, swipee_id)
         return {"status": "success", "message": t("match_success", lang) if match else t("swipe_registered", lang), "match": match}
     except psycopg2.Error:
         logger.exception("Databasefout bij het swipen.")
         raise HTTPException(status_code=500, detail=t("db_error", lang))
 
 @app.post("/dev/seed-likes-for-me")
-async def seed_likes_for_testing(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def seed_likes_for_testing(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     """
     DEV ONLY: Maak alle andere users like de ingelogde user (voor testen van match modal).
     SECURITY: 
@@ -1420,38 +1774,36 @@ async def seed_likes_for_testing(current_user: dict = Depends(get_current_user),
     conn, c = db
     user_id = current_user["id"]
     
-    c.execute("SELECT id FROM users WHERE id != %s AND deleted_at IS NULL AND profile_setup_complete = TRUE", (user_id,))
-    other_users = c.fetchall()
-    
-    count = 0
-    for (other_id,) in other_users:
-        c.execute(
-            """
-            INSERT INTO swipes (swiper_id, swipee_id, liked, deleted_at)
-            VALUES (%s, %s, TRUE, NULL)
-            ON CONFLICT (swiper_id, swipee_id)
-            DO UPDATE SET liked = TRUE, deleted_at = NULL
-            """,
-            (other_id, user_id),
-        )
-        count += 1
+    # Alle likes in één INSERT ... SELECT (geen rij-voor-rij round-trips)
+    c.execute(
+        """
+        INSERT INTO swipes (swiper_id, swipee_id, liked, deleted_at)
+        SELECT id, %s, TRUE, NULL
+        FROM users
+        WHERE id != %s AND deleted_at IS NULL AND profile_setup_complete = TRUE
+        ON CONFLICT (swiper_id, swipee_id)
+        DO UPDATE SET liked = TRUE, deleted_at = NULL
+        """,
+        (user_id, user_id),
+    )
+    count = c.rowcount
     
+    conn.commit()
+    invalidate_suggestions_cache()
     logger.info("DEV: %d users liken nu user %s", count, user_id)
     return {"status": "success", "message": f"{count} users now like you! Swipe right on anyone to trigger a match.", "count": count}
 
-@app.get("/matches")
-async def get_matches(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+@app.get("/matches", response_model=MatchesOut)
+def get_matches(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     conn, c = db
     user_id = current_user["id"]
     c.execute(
         """
         SELECT u.id, u.name, u.age, up.photo_url
-        FROM users u
-        JOIN swipes s1
-          ON s1.swipee_id = u.id
-         AND s1.swiper_id = %s
-         AND s1.liked = TRUE
-         AND s1.deleted_at IS NULL
+        FROM mutual_matches m
+        JOIN users u
+          ON u.id = m.match_id
+         AND u.deleted_at IS NULL
         LEFT JOIN LATERAL (
             SELECT photo_url
             FROM user_photos up
@@ -1459,117 +1811,119 @@ async def get_matches(current_user: dict = Depends(get_current_user), db=Depends
             ORDER BY up.id DESC
             LIMIT 1
         ) up ON TRUE
-        WHERE u.deleted_at IS NULL
-          AND EXISTS (
-              SELECT 1
-              FROM swipes s2
-              WHERE s2.swiper_id = u.id
-                AND s2.swipee_id = %s
-                AND s2.liked = TRUE
-                AND s2.deleted_at IS NULL
-          )
+        WHERE m.user_id = %s
         """,
-        (user_id, user_id),
+        (user_id,),
     )
     rows = c.fetchall()
     matches = [{"id": r[0], "name": r[1], "age": r[2], "photo_url": r[3]} for r in rows]
     return {"matches": matches}
 
 @app.post("/send_message")
-async def send_message(message: MessageIn, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def send_message(
+    message: MessageIn,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user),
+    db=Depends(get_db),
+):
     conn, c = db
     user_id = current_user["id"]
     lang = get_lang(current_user)
     match_id = message.match_id
     plain_message = message.message
-    timestamp = datetime.now(timezone.utc)
-    # check wederzijdse like
+    encrypted_message = encrypt_chat_message(plain_message)
+    # Insert alleen bij wederzijdse like (check + insert in één statement);
+    # timestamp komt van de database (DEFAULT NOW())
     c.execute(
         """
-        SELECT 1
-        FROM swipes
-        WHERE (
-            swiper_id = %s
-            AND swipee_id = %s
-            AND liked = TRUE
-            AND deleted_at IS NULL
-        )
-        AND EXISTS (
-            SELECT 1
-            FROM swipes
-            WHERE swiper_id = %s
-              AND swipee_id = %s
-              AND liked = TRUE
-              AND deleted_at IS NULL
+        INSERT INTO chats (match_id, sender_id, encrypted_message)
+        SELECT %s, %s, %s
+        WHERE EXISTS (
+            SELECT 1 FROM mutual_matches WHERE user_id = %s AND match_id = %s
         )
+        RETURNING timestamp
         """,
-        (user_id, match_id, match_id, user_id),
+        (match_id, user_id, encrypted_message, user_id, match_id),
     )
-    if not c.fetchone():
+    row = c.fetchone()
+    if row is None:
         raise HTTPException(status_code=403, detail=t("no_match_cannot_message", lang))
-    encrypted_message = cipher_suite.encrypt(plain_message.encode("utf-8")).decode("utf-8")
-    c.execute(
-        """
-        INSERT INTO chats (match_id, sender_id, encrypted_message, timestamp)
-        VALUES (%s, %s, %s, %s)
-        """,
-        (match_id, user_id, encrypted_message, timestamp),
-    )
+    timestamp = row[0]
     logger.info("Chatbericht van gebruiker %s naar gebruiker %s opgeslagen.", user_id, match_id)
+    # Eerst committen: de background task draait vóór get_db's commit, en de
+    # ontvanger moet het bericht ook via /chat/{id}/messages kunnen ophalen
+    conn.commit()
+    # Live aflevering aan de ontvanger na de response (background task)
+    background_tasks.add_task(
+        ws_manager.send_to_user,
+        match_id,
+        {
+            "type": "chat_message",
+            "sender_id": user_id,
+            "message": plain_message,
+            "timestamp": _to_isoz(timestamp),
+        },
+    )
     return {"status": "success", "message": t("message_sent", lang)}
 
-@app.get("/chat/{match_id}/messages")
-async def get_chat_messages(match_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+@app.get("/chat/{match_id}/messages", response_model=ChatHistoryOut)
+def get_chat_messages(
+    match_id: int,
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(CHAT_HISTORY_LIMIT, ge=1, le=CHAT_HISTORY_LIMIT),
+    current_user: dict = Depends(get_current_user),
+    db=Depends(get_db),
+):
+    """Chatgeschiedenis, nieuwste `limit` berichten (oud -> nieuw). Oudere berichten ophalen
+    met ?before=<next_before>&before_id=<next_before_id> uit het vorige antwoord; de cursor is
+    (timestamp, id), zodat berichten met dezelfde timestamp niet wegvallen."""
     conn, c = db
     user_id = current_user["id"]
     lang = get_lang(current_user)
     # toegang checken
     c.execute(
-        """
-        SELECT 1
-        FROM swipes
-        WHERE (
-            swiper_id = %s
-            AND swipee_id = %s
-            AND liked = TRUE
-            AND deleted_at IS NULL
-        )
-        AND EXISTS (
-            SELECT 1
-            FROM swipes
-            WHERE swiper_id = %s
-              AND swipee_id = %s
-              AND liked = TRUE
-              AND deleted_at IS NULL
-        )
-        """,
-        (user_id, match_id, match_id, user_id),
+        "SELECT 1 FROM mutual_matches WHERE user_id = %s AND match_id = %s",
+        (user_id, match_id),
     )
     if not c.fetchone():
         raise HTTPException(status_code=403, detail=t("chat_access_denied", lang))
     c.execute(
         """
-        SELECT sender_id, encrypted_message, timestamp
-        FROM chats
-        WHERE match_id = %s AND (deleted_at IS NULL)
-        ORDER BY timestamp ASC
+        SELECT id, sender_id, encrypted_message, timestamp
+        FROM (
+            SELECT id, sender_id, encrypted_message, timestamp
+            FROM chats
+            WHERE match_id = %s AND (deleted_at IS NULL)
+              -- zonder before_id: alles vóór de timestamp (ids zijn altijd > 0)
+              AND (%s::timestamptz IS NULL OR (timestamp, id) < (%s::timestamptz, COALESCE(%s::int, 0)))
+            ORDER BY timestamp DESC, id DESC
+            LIMIT %s
+        ) recent
+        ORDER BY timestamp ASC, id ASC
         """,
-        (match_id,),
+        (match_id, before, before, before_id, limit),
     )
     rows = c.fetchall()
-    chat_history: List[ChatMessage] = []
-    for sender_id, encrypted_message, ts in rows:
+    # Plain dicts in de vorm van ChatMessage: DB-data hoeft niet opnieuw gevalideerd te worden
+    chat_history: List[Dict[str, Any]] = []
+    for _, sender_id, encrypted_message, ts in rows:
         try:
-            decrypted = cipher_suite.decrypt(encrypted_message.encode("utf-8")).decode("utf-8")
+            decrypted = decrypt_chat_message(encrypted_message)
             iso_ts = _to_isoz(ts)
-            chat_history.append(ChatMessage(sender_id=sender_id, message=decrypted, timestamp=iso_ts))
+            chat_history.append({"sender_id": sender_id, "message": decrypted, "timestamp": iso_ts})
         except Exception:
             logger.exception("Fout bij decoderen van bericht.")
             continue
-    return {"chat_history": chat_history}
+    # Cursor voor de volgende (oudere) pagina; None als alles is opgehaald
+    if len(rows) == limit:
+        next_before, next_before_id = _to_isoz(rows[0][3]), rows[0][0]
+    else:
+        next_before = next_before_id = None
+    return {"chat_history": chat_history, "next_before": next_before, "next_before_id": next_before_id}
 
 @app.post("/report_user")
-async def report_user(report: ReportRequest, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def report_user(report: ReportRequest, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     conn, c = db
     reporter_id = current_user["id"]
     lang = get_lang(current_user)
@@ -1579,9 +1933,9 @@ async def report_user(report: ReportRequest, current_user: dict = Depends(get_cu
         c.execute(
             """
             INSERT INTO user_reports (reporter_id, reported_id, reason, timestamp)
-            VALUES (%s, %s, %s, %s)
+            VALUES (%s, %s, %s, NOW())
             """,
-            (reporter_id, report.reported_id, report.reason, datetime.now(timezone.utc)),
+            (reporter_id, report.reported_id, report.reason),
         )
         logger.info("Gebruiker %s gerapporteerd door gebruiker %s.", report.reported_id, reporter_id)
         return {"status": "success", "message": t("user_reported", lang)}
@@ -1590,7 +1944,7 @@ async def report_user(report: ReportRequest, current_user: dict = Depends(get_cu
         raise HTTPException(status_code=500, detail=t("db_error", lang))
 
 @app.post("/block_user")
-async def block_user(user_to_block_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def block_user(user_to_block_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     conn, c = db
     blocker_id = current_user["id"]
     lang = get_lang(current_user)
@@ -1600,25 +1954,29 @@ async def block_user(user_to_block_id: int, current_user: dict = Depends(get_cur
         c.execute(
             """
             INSERT INTO user_blocks (blocker_id, blocked_id, timestamp)
-            VALUES (%s, %s, %s)
+            VALUES (%s, %s, NOW())
             ON CONFLICT (blocker_id, blocked_id) DO NOTHING
             """,
-            (blocker_id, user_to_block_id, datetime.now(timezone.utc)),
+            (blocker_id, user_to_block_id),
         )
         if c.rowcount == 0:
             logger.info("Gebruiker %s was al geblokkeerd door gebruiker %s.", user_to_block_id, blocker_id)
             return {"status": "success", "message": t("user_already_blocked", lang)}
+        conn.commit()
+        invalidate_suggestions_cache(blocker_id, user_to_block_id)
         logger.info("Gebruiker %s succesvol geblokkeerd door gebruiker %s.", user_to_block_id, blocker_id)
         return {"status": "success", "message": t("user_blocked", lang)}
     except psycopg2.Error:
         logger.exception("Databasefout bij het blokkeren van gebruiker.")
         raise HTTPException(status_code=500, detail=t("db_error", lang))
 
-@app.delete("/delete/match/{match_id}")
-async def delete_match(match_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+@app.delete("/delete/match/{match_id}", status_code=204, response_class=Response)
+def delete_match(match_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)) -> Response:
     conn, c = db
     user_id = current_user["id"]
     lang = get_lang(current_user)
+    # Idempotente soft delete: commit hoeft niet op de WAL-flush te wachten
+    c.execute("SET LOCAL synchronous_commit = off")
     c.execute(
         """
         UPDATE swipes
@@ -1627,35 +1985,72 @@ async def delete_match(match_id: int, current_user: dict = Depends(get_current_u
             (swiper_id = %s AND swipee_id = %s AND liked = TRUE)
             OR (swiper_id = %s AND swipee_id = %s AND liked = TRUE)
         )
+        AND deleted_at IS NULL
         """,
         (user_id, match_id, match_id, user_id),
     )
+    if c.rowcount == 0:
+        raise HTTPException(status_code=404, detail=t("match_not_found", lang))
     logger.info("Match met gebruiker %s soft-verwijderd door gebruiker %s.", match_id, user_id)
-    return {"status": "success", "message": t("match_deleted", lang)}
+    return Response(status_code=204)
+
+@app.delete("/delete/matches")
+def delete_matches(body: MatchIdsIn, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+    """Meerdere matches in één UPDATE (en één commit) soft-verwijderen."""
+    conn, c = db
+    user_id = current_user["id"]
+    lang = get_lang(current_user)
+    match_ids = list(set(body.ids))
+    c.execute("SET LOCAL synchronous_commit = off")
+    c.execute(
+        """
+        UPDATE swipes
+        SET deleted_at = NOW()
+        WHERE liked = TRUE
+          AND deleted_at IS NULL
+          AND (
+            (swiper_id = %s AND swipee_id = ANY(%s))
+            OR (swipee_id = %s AND swiper_id = ANY(%s))
+          )
+        RETURNING CASE WHEN swiper_id = %s THEN swipee_id ELSE swiper_id END
+        """,
+        (user_id, match_ids, user_id, match_ids, user_id),
+    )
+    deleted_ids = sorted({row[0] for row in c.fetchall()})
+    if not deleted_ids:
+        raise HTTPException(status_code=404, detail=t("match_not_found", lang))
+    logger.info("%d matches soft-verwijderd door gebruiker %s.", len(deleted_ids), user_id)
+    return {"status": "success", "message": t("match_deleted", lang), "deleted_ids": deleted_ids}
 
 @app.delete("/delete_photo/{photo_id}")
-async def delete_photo(photo_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def delete_photo(photo_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     conn, c = db
     user_id = current_user["id"]
     lang = get_lang(current_user)
     try:
+        # Verwijderen en (indien nodig) de oudste resterende foto promoveren in één statement
         c.execute(
-            "SELECT is_profile_pic FROM user_photos WHERE id = %s AND user_id = %s",
-            (photo_id, user_id),
+            """
+            WITH del AS (
+                DELETE FROM user_photos
+                WHERE id = %s AND user_id = %s
+                RETURNING is_profile_pic
+            ), promote AS (
+                UPDATE user_photos SET is_profile_pic = 1
+                WHERE id = (SELECT MIN(id) FROM user_photos WHERE user_id = %s AND id <> %s)
+                  AND EXISTS (SELECT 1 FROM del WHERE is_profile_pic = 1)
+                RETURNING id
+            )
+            SELECT (SELECT is_profile_pic FROM del), (SELECT id FROM promote)
+            """,
+            (photo_id, user_id, user_id, photo_id),
         )
-        row = c.fetchone()
-        if not row:
+        was_profile, new_pic_id = c.fetchone()
+        if was_profile is None:
             raise HTTPException(status_code=404, detail=t("photo_not_found", lang))
-        was_profile = row[0] == 1
-        c.execute("DELETE FROM user_photos WHERE id = %s AND user_id = %s", (photo_id, user_id))
-        if c.rowcount == 0:
-            raise HTTPException(status_code=404, detail=t("photo_not_found", lang))
-        if was_profile:
-            c.execute("SELECT id FROM user_photos WHERE user_id = %s LIMIT 1", (user_id,))
-            new_pic = c.fetchone()
-            if new_pic:
-                c.execute("UPDATE user_photos SET is_profile_pic = 1 WHERE id = %s", (new_pic[0],))
-                logger.info("Nieuwe profielfoto %s toegewezen voor gebruiker %s.", new_pic[0], user_id)
+        if was_profile == 1:
+            if new_pic_id:
+                logger.info("Nieuwe profielfoto %s toegewezen voor gebruiker %s.", new_pic_id, user_id)
             else:
                 logger.warning("Gebruiker %s heeft geen profielfoto meer.", user_id)
         logger.info("Foto %s verwijderd voor gebruiker %s.", photo_id, user_id)
@@ -1665,17 +2060,24 @@ async def delete_photo(photo_id: int, current_user: dict = Depends(get_current_u
         raise HTTPException(status_code=500, detail=t("db_error", lang))
 
 @app.post("/upload_photo")
-async def upload_photo(photo: PhotoUpload, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def upload_photo(photo: PhotoUpload, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     conn, c = db
     user_id = current_user["id"]
     photo_url = str(photo.photo_url)
     lang = get_lang(current_user)
     try:
-        if photo.is_profile_pic:
-            c.execute("UPDATE user_photos SET is_profile_pic = 0 WHERE user_id = %s", (user_id,))
+        is_profile = int(bool(photo.is_profile_pic))
+        # Oude profielfoto resetten en nieuwe foto invoegen in één statement
         c.execute(
-            "INSERT INTO user_photos (user_id, photo_url, is_profile_pic) VALUES (%s,%s,%s)",
-            (user_id, photo_url, int(bool(photo.is_profile_pic))),
+            """
+            WITH reset AS (
+                UPDATE user_photos SET is_profile_pic = 0
+                WHERE user_id = %s AND is_profile_pic = 1 AND %s = 1
+            )
+            INSERT INTO user_photos (user_id, photo_url, is_profile_pic)
+            VALUES (%s, %s, %s)
+            """,
+            (user_id, is_profile, user_id, photo_url, is_profile),
         )
         logger.info(
             "Nieuwe foto geüpload voor gebruiker %s. URL: %s (profile: %s)",
@@ -1689,28 +2091,62 @@ async def upload_photo(photo: PhotoUpload, current_user: dict = Depends(get_curr
         raise HTTPException(status_code=500, detail=t("db_error", lang))
 
 # ------------------------- WebSocket -------------------------------
+class ConnectionManager:
+    """In-process register van open WebSockets per gebruiker (één proces, meerdere devices)."""
+    def __init__(self) -> None:
+        self.active: Dict[int, set] = {}
+
+    def connect(self, user_id: int, websocket: WebSocket) -> None:
+        self.active.setdefault(user_id, set()).add(websocket)
+
+    def disconnect(self, user_id: int, websocket: WebSocket) -> None:
+        sockets = self.active.get(user_id)
+        if sockets is None:
+            return
+        sockets.discard(websocket)
+        if not sockets:
+            self.active.pop(user_id, None)
+
+    async def send_to_user(self, user_id: int, payload: Dict[str, Any]) -> None:
+        # Alle devices parallel bedienen: één trage socket houdt de rest niet op
+        sockets = list(self.active.get(user_id, ()))
+        if not sockets:
+            return
+        results = await asyncio.gather(
+            *(websocket.send_json(payload) for websocket in sockets),
+            return_exceptions=True,
+        )
+        for websocket, result in zip(sockets, results):
+            if isinstance(result, Exception):
+                logger.warning("WebSocket-aflevering aan gebruiker %s mislukt; socket verwijderd.", user_id)
+                self.disconnect(user_id, websocket)
+
+ws_manager = ConnectionManager()
+
+def _ws_resolve_user(token: str) -> dict:
+    with DB() as (conn, c):
+        return resolve_user_from_token(token, c)
+
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: int):
     token = websocket.query_params.get("token")
     if not token:
         await websocket.close(code=4401)
         return
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            await websocket.close(code=4401)
+    # Zelfde validatie als HTTP (incl. auth-cache); een DB-lookup draait buiten de event loop
+    user = get_cached_user(token)
+    if user is None:
+        try:
+            user = await run_in_threadpool(_ws_resolve_user, token)
+        except HTTPException as e:
+            # 1013 = "try again later" bij een volle pool; anders ongeldige token
+            await websocket.close(code=1013 if e.status_code == 503 else 4401)
             return
-        with DB() as (conn, c):
-            c.execute("SELECT id FROM users WHERE username = %s AND deleted_at IS NULL", (username,))
-            row = c.fetchone()
-            if not row or row[0] != user_id:
-                await websocket.close(code=4403)  # forbidden
-                return
-    except JWTError:
-        await websocket.close(code=4401)
+    if user["id"] != user_id:
+        await websocket.close(code=4403)  # forbidden
         return
     await websocket.accept()
+    ws_manager.connect(user_id, websocket)
     logger.info("WebSocket geaccepteerd voor gebruiker %s (via token).", user_id)
     try:
         while True:
@@ -1720,34 +2156,19 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
         logger.info("WebSocket gesloten voor gebruiker %s.", user_id)
     except Exception:
         logger.exception("WebSocket fout voor gebruiker %s.", user_id)
+    finally:
+        ws_manager.disconnect(user_id, websocket)
 
 # ------------------------- Route Suggestion ------------------------
 @app.get("/suggest_route/{match_id}")
-async def get_route_suggestion(match_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def get_route_suggestion(match_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     conn, c = db
     user_id = current_user["id"]
     lang = get_lang(current_user)
     # check wederzijdse like
     c.execute(
-        """
-        SELECT 1
-        FROM swipes
-        WHERE (
-            swiper_id = %s
-            AND swipee_id = %s
-            AND liked = TRUE
-            AND deleted_at IS NULL
-        )
-        AND EXISTS (
-            SELECT 1
-            FROM swipes
-            WHERE swiper_id = %s
-              AND swipee_id = %s
-              AND liked = TRUE
-              AND deleted_at IS NULL
-        )
-        """,
-        (user_id, match_id, match_id, user_id),
+        "SELECT 1 FROM mutual_matches WHERE user_id = %s AND match_id = %s",
+        (user_id, match_id),
     )
     if not c.fetchone():
         raise HTTPException(status_code=403, detail=t("chat_access_denied", lang))
@@ -1788,6 +2209,46 @@ async def get_route_suggestion(match_id: int, current_user: dict = Depends(get_c
 import urllib.parse
 import httpx
 
+# De Strava-handlers zijn async (httpx naar Strava); psycopg2 blokkeert, dus hun
+# databasewerk loopt via run_in_threadpool in deze helpers i.p.v. op de event loop.
+def _fetch_strava_tokens(c, user_id: int) -> Optional[tuple]:
+    c.execute(
+        "SELECT strava_token, strava_refresh_token, strava_expires_at FROM users WHERE id = %s",
+        (user_id,)
+    )
+    return c.fetchone()
+
+def _save_strava_tokens(conn, c, user_id: int, encrypted_access: str, encrypted_refresh: str,
+                        expires_at: Optional[int], athlete_id: Optional[int] = None) -> None:
+    c.execute(
+        """
+        UPDATE users 
+        SET strava_token = %s, 
+            strava_refresh_token = %s,
+            strava_expires_at = %s,
+            strava_athlete_id = COALESCE(%s, strava_athlete_id)
+        WHERE id = %s
+        """,
+        (encrypted_access, encrypted_refresh, expires_at, athlete_id, user_id)
+    )
+    conn.commit()
+    invalidate_auth_cache(user_id)
+
+def _clear_strava_tokens(conn, c, user_id: int) -> None:
+    c.execute(
+        """
+        UPDATE users 
+        SET strava_token = NULL, 
+            strava_refresh_token = NULL,
+            strava_expires_at = NULL,
+            strava_athlete_id = NULL
+        WHERE id = %s
+        """,
+        (user_id,)
+    )
+    conn.commit()
+    invalidate_auth_cache(user_id)
+
 @app.get("/strava/auth-url")
 async def get_strava_auth_url(current_user: dict = Depends(get_current_user)):
     """Genereer de Strava OAuth authorization URL"""
@@ -1853,18 +2314,9 @@ async def strava_callback(code: str, state: str, db=Depends(get_db)):
     encrypted_access = cipher_suite.encrypt(access_token.encode()).decode()
     encrypted_refresh = cipher_suite.encrypt(refresh_token.encode()).decode()
     
-    c.execute(
-        """
-        UPDATE users 
-        SET strava_token = %s, 
-            strava_refresh_token = %s,
-            strava_expires_at = %s,
-            strava_athlete_id = %s
-        WHERE id = %s
-        """,
-        (encrypted_access, encrypted_refresh, expires_at, athlete.get("id"), user_id)
+    await run_in_threadpool(
+        _save_strava_tokens, conn, c, user_id, encrypted_access, encrypted_refresh, expires_at, athlete.get("id")
     )
-    conn.commit()
     
     logger.info("Strava gekoppeld voor user %s (athlete: %s)", user_id, athlete.get("id"))
     
@@ -1885,23 +2337,11 @@ async def strava_callback(code: str, state: str, db=Depends(get_db)):
     """)
 
 @app.post("/strava/disconnect")
-async def disconnect_strava(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def disconnect_strava(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     """Ontkoppel Strava account"""
     conn, c = db
     user_id = current_user["id"]
-    
-    c.execute(
-        """
-        UPDATE users 
-        SET strava_token = NULL, 
-            strava_refresh_token = NULL,
-            strava_expires_at = NULL,
-            strava_athlete_id = NULL
-        WHERE id = %s
-        """,
-        (user_id,)
-    )
-    conn.commit()
+    _clear_strava_tokens(conn, c, user_id)
     
     logger.info("Strava ontkoppeld voor user %s", user_id)
     return {"status": "success", "message": "Strava account ontkoppeld"}
@@ -1913,11 +2353,7 @@ async def get_strava_activities(current_user: dict = Depends(get_current_user),
     user_id = current_user["id"]
     
     # Haal Strava tokens op
-    c.execute(
-        "SELECT strava_token, strava_refresh_token, strava_expires_at FROM users WHERE id = %s",
-        (user_id,)
-    )
-    row = c.fetchone()
+    row = await run_in_threadpool(_fetch_strava_tokens, c, user_id)
     if not row or not row[0]:
         raise HTTPException(status_code=400, detail="Strava niet gekoppeld")
     
@@ -1926,18 +2362,7 @@ async def get_strava_activities(current_user: dict = Depends(get_current_user),
     # Check if refresh token exists
     if not encrypted_access or not encrypted_refresh:
         # Cleanup incomplete Strava linking
-        c.execute(
-            """
-            UPDATE users 
-            SET strava_token = NULL, 
-                strava_refresh_token = NULL,
-                strava_expires_at = NULL,
-                strava_athlete_id = NULL
-            WHERE id = %s
-            """,
-            (user_id,)
-        )
-        conn.commit()
+        await run_in_threadpool(_clear_strava_tokens, conn, c, user_id)
         raise HTTPException(status_code=400, detail="Strava niet volledig gekoppeld - probeer opnieuw")
     
     # Decrypt access token
@@ -1947,18 +2372,7 @@ async def get_strava_activities(current_user: dict = Depends(get_current_user),
     except Exception as e:
         logger.error("Failed to decrypt Strava token: %s", e)
         # Cleanup corrupted tokens
-        c.execute(
-            """
-            UPDATE users 
-            SET strava_token = NULL, 
-                strava_refresh_token = NULL,
-                strava_expires_at = NULL,
-                strava_athlete_id = NULL
-            WHERE id = %s
-            """,
-            (user_id,)
-        )
-        conn.commit()
+        await run_in_threadpool(_clear_strava_tokens, conn, c, user_id)
         raise HTTPException(status_code=500, detail="Token decryptie mislukt - koppel Strava opnieuw")
     
     # Check if token expired and refresh if needed
@@ -1986,18 +2400,7 @@ async def get_strava_activities(current_user: dict = Depends(get_current_user),
             # Alleen cleanup bij permanente failures (401/403 = revoked access)
             if refresh_response.status_code in [401, 403]:
                 logger.warning("Strava access revoked for user %s, cleaning up", user_id)
-                c.execute(
-                    """
-                    UPDATE users 
-                    SET strava_token = NULL, 
-                        strava_refresh_token = NULL,
-                        strava_expires_at = NULL,
-                        strava_athlete_id = NULL
-                    WHERE id = %s
-                    """,
-                    (user_id,)
-                )
-                conn.commit()
+                await run_in_threadpool(_clear_strava_tokens, conn, c, user_id)
                 raise HTTPException(
                     status_code=401, 
                     detail="Strava toegang ingetrokken - koppel opnieuw"
@@ -2027,17 +2430,9 @@ async def get_strava_activities(current_user: dict = Depends(get_current_user),
         encrypted_access = cipher_suite.encrypt(access_token.encode()).decode()
         encrypted_refresh_new = cipher_suite.encrypt(new_refresh_token.encode()).decode()
         
-        c.execute(
-            """
-            UPDATE users 
-            SET strava_token = %s, 
-                strava_refresh_token = %s,
-                strava_expires_at = %s
-            WHERE id = %s
-            """,
-            (encrypted_access, encrypted_refresh_new, new_expires_at, user_id)
+        await run_in_threadpool(
+            _save_strava_tokens, conn, c, user_id, encrypted_access, encrypted_refresh_new, new_expires_at
         )
-        conn.commit()
         logger.info("Strava token refreshed successfully for user %s", user_id)
     
     # Haal activiteiten op van Strava API
@@ -2091,11 +2486,19 @@ async def home():
 
 # ------------------------- Main -----------------------------------
 if __name__ == "__main__":
+    # uvloop/httptools worden automatisch gebruikt als ze geïnstalleerd zijn (uvicorn[standard]).
+    # Eén worker is een vereiste, geen standaardwaarde: WebSocket-push (ws_manager), de
+    # Idempotency-Key-cache en de auth-/suggestiecaches zijn per proces (zie README).
+    reload = os.environ.get("UVICORN_RELOAD", "0") == "1"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=int(os.environ.get("PORT", "8000")),
-        reload=True,
+        workers=None if reload else int(os.environ.get("WEB_CONCURRENCY", "1")),
+        loop="auto",
+        http="auto",
+        log_level=os.environ.get("LOG_LEVEL", "info").lower(),
+        reload=reload,
     )
 
 
@@ -1,14 +1,21 @@
-from pydantic import BaseModel, Field, conint
+from typing import Annotated
+
+from pydantic import BaseModel, ConfigDict, Field
+
+Age = Annotated[int, Field(ge=18, le=99)]
 
 class UserPublic(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     id: int
     username: str
     name: str | None = None
-    age: conint(ge=18, le=99) | None = None
+    age: Age | None = None
     bio: str | None = None
 
 class UserUpdate(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     name: str | None = None
-    age: conint(ge=18, le=99) | None = None
+    age: Age | None = None
     bio: str | None = None
-``
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, Tuple
 from enum import Enum
 import logging
 
@@ -33,8 +33,13 @@ class GenderPreference(str, Enum):
     female = "female"
     non_binary = "non_binary"
 
+# Enum -> databasewaarde, één keer opgebouwd bij import
+_ENUM_VALUES = {m: m.value for enum in (MessagePreference, MatchGoal, GenderPreference) for m in enum}
+
 class UserSettings(BaseModel):
-    sports: List[str] = Field(default_factory=list)
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    sports: Tuple[str, ...] = ()
     show_location: bool = True
     allow_messages_from: MessagePreference = Field(default=MessagePreference.everyone)
     strava_token: Optional[str] = None
@@ -44,6 +49,39 @@ class UserSettings(BaseModel):
     max_distance_km: Optional[int] = 50
     notifications_enabled: Optional[bool] = True
 
+UPSERT_SETTINGS_SQL = """
+    INSERT INTO user_settings (
+        user_id, sports, show_location, allow_messages_from, strava_token, garmin_token,
+        match_goal, preferred_gender, max_distance_km, notifications_enabled
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+        sports = EXCLUDED.sports,
+        show_location = EXCLUDED.show_location,
+        allow_messages_from = EXCLUDED.allow_messages_from,
+        strava_token = EXCLUDED.strava_token,
+        garmin_token = EXCLUDED.garmin_token,
+        match_goal = EXCLUDED.match_goal,
+        preferred_gender = EXCLUDED.preferred_gender,
+        max_distance_km = EXCLUDED.max_distance_km,
+        notifications_enabled = EXCLUDED.notifications_enabled
+"""
+
+def _settings_params(user_id: int, settings: UserSettings) -> tuple:
+    return (
+        user_id,
+        list(settings.sports),  # psycopg2 maakt van een list een ARRAY, van een tuple niet
+        settings.show_location,
+        _ENUM_VALUES[settings.allow_messages_from],
+        settings.strava_token,
+        settings.garmin_token,
+        _ENUM_VALUES.get(settings.match_goal),
+        _ENUM_VALUES.get(settings.preferred_gender),
+        settings.max_distance_km,
+        settings.notifications_enabled
+    )
+
 @router.get("/users/{user_id}/settings", response_model=UserSettings)
 def get_user_settings(user_id: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     if user_id != current_user["id"]:
@@ -59,7 +97,7 @@ def get_user_settings(user_id: int, current_user: dict = Depends(get_current_use
     if not row:
         return UserSettings()
     return UserSettings(
-        sports=row[0] or [],
+        sports=row[0] or (),
         show_location=row[1],
         allow_messages_from=row[2],
         strava_token=row[3],
@@ -76,35 +114,7 @@ def update_user_settings(user_id: int, settings: UserSettings, current_user: dic
         raise HTTPException(status_code=403, detail="Geen toestemming om instellingen bij te werken.")
     conn, c = db
     try:
-        c.execute("""
-            INSERT INTO user_settings (
-                user_id, sports, show_location, allow_messages_from, strava_token, garmin_token,
-                match_goal, preferred_gender, max_distance_km, notifications_enabled
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (user_id)
-            DO UPDATE SET
-                sports = EXCLUDED.sports,
-                show_location = EXCLUDED.show_location,
-                allow_messages_from = EXCLUDED.allow_messages_from,
-                strava_token = EXCLUDED.strava_token,
-                garmin_token = EXCLUDED.garmin_token,
-                match_goal = EXCLUDED.match_goal,
-                preferred_gender = EXCLUDED.preferred_gender,
-                max_distance_km = EXCLUDED.max_distance_km,
-                notifications_enabled = EXCLUDED.notifications_enabled
-        """, (
-            user_id,
-            settings.sports,
-            settings.show_location,
-            settings.allow_messages_from.value,
-            settings.strava_token,
-            settings.garmin_token,
-            settings.match_goal,
-            settings.preferred_gender,
-            settings.max_distance_km,
-            settings.notifications_enabled
-        ))
+        c.execute(UPSERT_SETTINGS_SQL, _settings_params(user_id, settings))
         conn.commit()
         return {"status": "success", "message": "Instellingen succesvol opgeslagen."}
     except Exception as e:
@@ -1,10 +1,11 @@
 # translations.py
+from types import MappingProxyType
 
 translations = {
     "nl": {
         # --- E-mail ---
         "email_verification_subject": "Bevestig je e-mailadres voor Athlo",
-        "email_verification_body": lambda name, link: f"""
+        "email_verification_body": """
 Welkom bij Athlo, {name}!
 Bedankt voor je registratie. Klik op onderstaande link om je e-mailadres te bevestigen:
 {link}
@@ -37,6 +38,7 @@ Het Athlo Team
         "user_already_blocked": "Gebruiker was al geblokkeerd.",
         "cannot_block_self": "Je kunt jezelf niet blokkeren.",
         "match_deleted": "Match succesvol verwijderd.",
+        "match_not_found": "Match niet gevonden.",
         "photo_deleted": "Foto succesvol verwijderd.",
         "photo_not_found": "Foto niet gevonden of geen permissie.",
         "photo_uploaded": "Foto succesvol geüpload.",
@@ -60,6 +62,8 @@ Het Athlo Team
         "end_time_after_start": "end_time moet later zijn dan start_time.",
         "cannot_swipe_self": "Je kunt niet op je eigen profiel swipen.",
         "db_error": "Databasefout.",
+        "server_busy": "Server is even te druk. Probeer het zo opnieuw.",
+        "idempotency_key_reused": "Idempotency-Key is al gebruikt voor een ander verzoek.",
         "token_missing": "Kon validatiegegevens niet verifiëren.",
         "token_invalid": "Ongeldige of verlopen token.",
         "username_already_exists": "Deze gebruikersnaam is al in gebruik. Kies een andere.",
@@ -89,7 +93,7 @@ Het Athlo Team
     "en": {
         # --- Email ---
         "email_verification_subject": "Confirm your email address for Athlo",
-        "email_verification_body": lambda name, link: f"""
+        "email_verification_body": """
 Welcome to Athlo, {name}!
 Thank you for registering. Click the link below to confirm your email address:
 {link}
@@ -122,6 +126,7 @@ The Athlo Team
         "user_already_blocked": "User was already blocked.",
         "cannot_block_self": "You cannot block yourself.",
         "match_deleted": "Match deleted successfully.",
+        "match_not_found": "Match not found.",
         "photo_deleted": "Photo deleted successfully.",
         "photo_not_found": "Photo not found or no permission.",
         "photo_uploaded": "Photo uploaded successfully.",
@@ -145,6 +150,8 @@ The Athlo Team
         "end_time_after_start": "end_time must be later than start_time.",
         "cannot_swipe_self": "You cannot swipe on your own profile.",
         "db_error": "Database error.",
+        "server_busy": "Server is busy. Please try again shortly.",
+        "idempotency_key_reused": "Idempotency-Key was already used for a different request.",
         
         # Password Reset
         "password_reset_subject": "Reset your password for Athlo",
@@ -174,7 +181,7 @@ The Athlo Team
     "fr": {
         # --- E-mail ---
         "email_verification_subject": "Confirmez votre adresse e-mail pour Athlo",
-        "email_verification_body": lambda name, link: f"""
+        "email_verification_body": """
 Bienvenue sur Athlo, {name} !
 Merci pour votre inscription. Cliquez sur le lien ci-dessous pour confirmer votre adresse e-mail :
 {link}
@@ -207,6 +214,7 @@ L'équipe Athlo
         "user_already_blocked": "L'utilisateur était déjà bloqué.",
         "cannot_block_self": "Vous ne pouvez pas vous bloquer vous-même.",
         "match_deleted": "Match supprimé avec succès.",
+        "match_not_found": "Match introuvable.",
         "photo_deleted": "Photo supprimée avec succès.",
         "photo_not_found": "Photo introuvable ou sans autorisation.",
         "photo_uploaded": "Photo téléchargée avec succès.",
@@ -230,6 +238,8 @@ L'équipe Athlo
         "end_time_after_start": "end_time doit être postérieure à start_time.",
         "cannot_swipe_self": "Vous ne pouvez pas swiper votre propre profil.",
         "db_error": "Erreur de base de données.",
+        "server_busy": "Le serveur est momentanément surchargé. Veuillez réessayer dans un instant.",
+        "idempotency_key_reused": "Cette Idempotency-Key a déjà été utilisée pour une autre requête.",
         "no_email_address": "Aucune adresse e-mail fournie. Veuillez d'abord ajouter une adresse e-mail à votre profil.",
         "token_missing": "Impossible de vérifier les informations d’identification.",
         "token_invalid": "Jeton invalide ou expiré.",
@@ -240,7 +250,7 @@ L'équipe Athlo
     "de": {
         # --- E-Mail ---
         "email_verification_subject": "Bestätigen Sie Ihre E-Mail-Adresse für Athlo",
-        "email_verification_body": lambda name, link: f"""
+        "email_verification_body": """
 Willkommen bei Athlo, {name}!
 Vielen Dank für Ihre Registrierung. Klicken Sie auf den folgenden Link, um Ihre E-Mail-Adresse zu bestätigen:
 {link}
@@ -273,6 +283,7 @@ Das Athlo-Team
         "user_already_blocked": "Benutzer war bereits blockiert.",
         "cannot_block_self": "Sie können sich nicht selbst blockieren.",
         "match_deleted": "Match erfolgreich gelöscht.",
+        "match_not_found": "Match nicht gefunden.",
         "photo_deleted": "Foto erfolgreich gelöscht.",
         "photo_not_found": "Foto nicht gefunden oder keine Berechtigung.",
         "photo_uploaded": "Foto erfolgreich hochgeladen.",
@@ -296,6 +307,8 @@ Das Athlo-Team
         "end_time_after_start": "end_time muss nach start_time liegen.",
         "cannot_swipe_self": "Sie können Ihr eigenes Profil nicht swipen.",
         "db_error": "Datenbankfehler.",
+        "server_busy": "Der Server ist gerade ausgelastet. Bitte versuchen Sie es gleich erneut.",
+        "idempotency_key_reused": "Dieser Idempotency-Key wurde bereits für eine andere Anfrage verwendet.",
         "no_email_address": "Keine E-Mail-Adresse angegeben. Bitte fügen Sie zuerst eine E-Mail-Adresse zu Ihrem Profil hinzu.",
         "token_missing": "Anmeldedaten konnten nicht überprüft werden.",
         "token_invalid": "Ungültiges oder abgelaufenes Token.",
@@ -306,7 +319,7 @@ Das Athlo-Team
     "es": {
         # --- Correo ---
         "email_verification_subject": "Confirma tu dirección de correo electrónico para Athlo",
-        "email_verification_body": lambda name, link: f"""
+        "email_verification_body": """
 ¡Bienvenido a Athlo, {name}!
 Gracias por registrarte. Haz clic en el siguiente enlace para confirmar tu dirección de correo electrónico:
 {link}
@@ -338,6 +351,7 @@ El equipo de Athlo
         "user_already_blocked": "El usuario ya estaba bloqueado.",
         "cannot_block_self": "No puedes bloquearte a ti mismo.",
         "match_deleted": "Match eliminado correctamente.",
+        "match_not_found": "Match no encontrado.",
         "photo_deleted": "Foto eliminada correctamente.",
         "photo_not_found": "Foto no encontrada o sin permisos.",
         "photo_uploaded": "Foto subida correctamente.",
@@ -361,6 +375,8 @@ El equipo de Athlo
         "end_time_after_start": "end_time debe ser posterior a start_time.",
         "cannot_swipe_self": "No puedes hacer swipe en tu propio perfil.",
         "db_error": "Error de base de datos.",
+        "server_busy": "El servidor está ocupado. Inténtalo de nuevo en un momento.",
+        "idempotency_key_reused": "Esta Idempotency-Key ya se usó para otra solicitud.",
         "no_email_address": "No se ha proporcionado una dirección de correo electrónico. Por favor, añade primero una dirección de correo a tu perfil.",
         "token_missing": "No se pudieron verificar las credenciales.",
         "token_invalid": "Token inválido o expirado.",
@@ -371,7 +387,7 @@ El equipo de Athlo
     "pt": {
         # --- E-mail ---
         "email_verification_subject": "Confirme seu endereço de e-mail para Athlo",
-        "email_verification_body": lambda name, link: f"""
+        "email_verification_body": """
 Bem-vindo ao Athlo, {name}!
 Obrigado por se registrar. Clique no link abaixo para confirmar seu endereço de e-mail:
 {link}
@@ -403,6 +419,7 @@ Equipe Athlo
         "user_already_blocked": "O usuário já estava bloqueado.",
         "cannot_block_self": "Você não pode se bloquear.",
         "match_deleted": "Match excluído com sucesso.",
+        "match_not_found": "Match não encontrado.",
         "photo_deleted": "Foto excluída com sucesso.",
         "photo_not_found": "Foto não encontrada ou sem permissão.",
         "photo_uploaded": "Foto enviada com sucesso.",
@@ -426,6 +443,8 @@ Equipe Athlo
         "end_time_after_start": "end_time deve ser posterior a start_time.",
         "cannot_swipe_self": "Você não pode fazer swipe no seu próprio perfil.",
         "db_error": "Erro de banco de dados.",
+        "server_busy": "O servidor está ocupado. Tente novamente em instantes.",
+        "idempotency_key_reused": "Esta Idempotency-Key já foi usada para outra solicitação.",
         "no_email_address": "Nenhum endereço de e-mail fornecido. Por favor, adicione primeiro um endereço de e-mail ao seu perfil.",
         "token_missing": "Não foi possível verificar as credenciais.",
         "token_invalid": "Token inválido ou expirado.",
@@ -436,7 +455,7 @@ Equipe Athlo
     "it": {
         # --- Email ---
         "email_verification_subject": "Conferma il tuo indirizzo email per Athlo",
-        "email_verification_body": lambda name, link: f"""
+        "email_verification_body": """
 Benvenuto su Athlo, {name}!
 Grazie per esserti registrato. Clicca sul link qui sotto per confermare il tuo indirizzo email:
 {link}
@@ -468,6 +487,7 @@ Il team di Athlo
         "user_already_blocked": "L'utente era già bloccato.",
         "cannot_block_self": "Non puoi bloccare te stesso.",
         "match_deleted": "Match eliminato con successo.",
+        "match_not_found": "Match non trovato.",
         "photo_deleted": "Foto eliminata con successo.",
         "photo_not_found": "Foto non trovata o senza autorizzazione.",
         "photo_uploaded": "Foto caricata con successo.",
@@ -491,6 +511,8 @@ Il team di Athlo
         "end_time_after_start": "end_time deve essere successivo a start_time.",
         "cannot_swipe_self": "Non puoi fare swipe sul tuo stesso profilo.",
         "db_error": "Errore del database.",
+        "server_busy": "Il server è momentaneamente occupato. Riprova tra poco.",
+        "idempotency_key_reused": "Questa Idempotency-Key è già stata usata per un'altra richiesta.",
         "no_email_address": "Nessun indirizzo e-mail fornito. Aggiungi prima un indirizzo e-mail al tuo profilo.",
         "token_missing": "Impossibile verificare le credenziali.",
         "token_invalid": "Token non valido o scaduto.",
@@ -498,3 +520,15 @@ Il team di Athlo
         "email_already_exists": "Questo indirizzo email è già registrato.",
     },
 }
+
+# Read-only (MappingProxyType), want dezelfde mappings worden door alle requests gedeeld.
+translations = MappingProxyType({
+    lang: MappingProxyType(texts) for lang, texts in translations.items()
+})
+
+# Per taal één dict waarin de Engelse teksten als fallback al zijn ingevuld:
+# een lookup is dan één dict-hit, ook voor sleutels die in een taal ontbreken.
+resolved_translations = MappingProxyType({
+    lang: MappingProxyType({**translations["en"], **texts})
+    for lang, texts in translations.items()
+})